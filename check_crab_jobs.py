@@ -2,28 +2,110 @@ import os
 import sys
 import json
 
-from argparse import ArgumentParser, RawDescriptionHelpFormatter
-from tqdm import tqdm
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from itertools import chain
 from collections.abc import Iterable
 from typing import Any
-from subprocess import call
-import numpy as np
+
+# orjson is much faster than json for the large files written by crab
+# and for the summary, but it is not available everywhere
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 thisdir = os.path.realpath(os.path.dirname(__file__))
 
 if not thisdir in sys.path:
     sys.path.append(thisdir)
 
-from wlcg_dbs_interface import WLCGInterface
-interface = WLCGInterface()
+# interface to the WLCG site, DBS and DAS. Importing it loads heavy
+# dependencies, so it is only set up when needed, see `setup_interface`
+interface = None
 wlcg_template= os.path.join("{wlcg_prefix}{wlcg_dir}",
     "{sample_name}",
     "{crab_dirname}",
     "{time_stamp}",
 )
-verbosity=0
+# crab base directories (and the corresponding status files) that are
+# checked if nothing else is specified via the command line
+default_suffices = ("", "recovery_1", "recovery_2")
+default_status_files = ("status_0", "status_1", "status")
+# maximum number of samples that are checked in parallel (and of threads
+# per sample that list the output blocks), see the `--jobs` option. The
+# checks mostly wait for DBS and the remote site, so use more than one per CPU
+default_jobs = min(32, (os.cpu_count() or 4) * 4)
+# maximum number of threads used to list the output blocks of a crab
+# directory on the WLCG site, can be set with the `--jobs` option. The
+# threads are only started when needed, i.e. at most one per block
+max_listing_workers=16
+# thread pool for the listings, see `get_listing_executor`
+listing_executor=None
+
+
+def setup_interface(verbosity: int=0, use_disk_cache: bool=True) -> None:
+    """Function to set up the global WLCGInterface *interface*.
+    The interface (and thus gfal2, dbs, yaml, ...) is only imported here,
+    so that e.g. `--help` or invalid arguments do not need to load them.
+
+    Args:
+        verbosity (int, optional): verbosity of the interface. Defaults to 0.
+        use_disk_cache (bool, optional):    use the on-disk cache for DBS and
+                                            DAS queries. Defaults to True.
+    """
+    global interface
+    if interface is None:
+        from wlcg_dbs_interface import WLCGInterface
+        interface = WLCGInterface()
+    interface.verbosity = verbosity
+    interface.use_disk_cache = use_disk_cache
+
+def load_json(path: str) -> Any:
+    """Load the content of the .json file in *path*. If available, orjson
+    is used to parse the file, else the json module is used.
+
+    Args:
+        path (str): path to the .json file
+
+    Returns:
+        Any: content of the .json file
+    """
+    with open(path, "rb") as f:
+        if orjson:
+            return orjson.loads(f.read())
+        return json.load(f)
+
+def get_listing_executor() -> ThreadPoolExecutor:
+    """Function to obtain the thread pool used to list the outputs on the
+    WLCG site. The pool is created on first use and reused for all crab
+    directories and samples checked in this process. This way, the threads
+    and the gfal contexts they create are only set up once.
+
+    Returns:
+        ThreadPoolExecutor: thread pool for the remote listings
+    """
+    global listing_executor
+    if listing_executor is None:
+        listing_executor = ThreadPoolExecutor(max_workers=max_listing_workers)
+    return listing_executor
 
+def dump_json(obj: Any, path: str) -> None:
+    """Save *obj* in the .json file in *path*. If available, orjson is used
+    to serialize *obj*, which is much faster for the long lists of lfns
+    that can be part of the summary. Else, the json module is used.
+
+    Args:
+        obj (Any): object to save
+        path (str): path to the output .json file
+    """
+    if orjson:
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(
+                obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+            ))
+    else:
+        with open(path, "w") as f:
+            json.dump(obj, f, indent=2)
 
 def get_job_inputs(crab_dir: str, job_input_file: str="job_input_files.json"):
     """Load job input file. This .json file contains the mapping of the form
@@ -58,8 +140,7 @@ def get_job_inputs(crab_dir: str, job_input_file: str="job_input_files.json"):
         return None
 
     # load json file
-    with open(path) as f:
-        input_map = json.load(f)
+    input_map = load_json(path)
 
     return input_map
 
@@ -91,11 +172,9 @@ def get_status(sample_dir: str, status_file: str, crab_dir: str) -> dict[str, di
 
     # now check if the file in either *status_path* or the backup exists
     if os.path.exists(status_path):
-        with open(status_path) as f:
-            status = json.load(f)
+        status = load_json(status_path)
     elif os.path.exists(backup_status_path):
-        with open(backup_status_path) as f:
-            status = json.load(f)
+        status = load_json(backup_status_path)
     else:
         # if they do not exist, raise an error
         raise NotImplementedError("Obtaining the status from crab not implemented yet!")
@@ -143,15 +222,19 @@ def check_crab_directory(
     job_input_file: str="job_input_files.json",
     event_lookup: dict[str, int] or None=None,
     event_comparison_container: list[dict[str, Any]] or None=None,
+    known_lfns_future: Future or None=None,
+    verbosity: int=0,
     **kwargs,
 ) -> None:
     """Function to check a specific crab base directory in *sample_dir*.
     First, the name of the crab base directory (*crab_dir*) is built from
     *sample_dir*, *sample_name* and *suffix*.
-    Then, the input file list and the status of the jobs of *crab_dir* is loaded.
+    Then, the input file list and the status of the jobs of *crab_dir* is loaded
+    and the outputs of the jobs on the WLCG site are listed.
     For book-keeping purposes, a set of known lfns *known_lfns* is also required.
-    If this set is empty (which should happen for the first crab base directory
-    that (should) consider all lfns), fill this set.
+    If this set is empty, it is filled with the result of *known_lfns_future*
+    (if given). If it is still empty (which should happen for the first crab
+    base directory that (should) consider all lfns), fill this set.
     If there are unknown lfns in the other (recovery) jobs, raise an error.
     Additionally, obtain the time stamp of the current crab job to correctly
     load/check the output of the jobs on the WLCG site.
@@ -184,11 +267,23 @@ def check_crab_directory(
                                         mapping of job_id -> input file(s) for
                                         a given *crab_dir*. 
                                         Defaults to "job_input_files.json".
+        known_lfns_future (Future, optional):   Future that provides the set
+                                                of known lfns, e.g. from a DBS
+                                                query running in the background.
+                                                Defaults to None.
+        verbosity (int, optional):  verbosity level of the output.
+                                    Defaults to 0.
 
     Raises:
         ValueError: If previously unkown lfns are encountered
         ValueError: if the time stamp of a given crab job cannot be obtained
     """    
+    from tqdm import tqdm
+    # the interface is usually set up by `_init_worker`, but make sure this
+    # function can also be used on its own
+    if interface is None:
+        setup_interface(verbosity=verbosity)
+
     # build name of current crab base directory
     if not suffix == "" and not suffix.startswith("_"):
         suffix = "_"+suffix
@@ -207,40 +302,6 @@ def check_crab_directory(
         if verbosity >= 1:
             print(f"WARNING: could not load input map for directory {crab_dir}")
         return
-    # perform sanity checks
-    # first load a flat list of lfns
-    flat_lfns = set(chain.from_iterable(input_map.values()))
-
-    # if we don't know any lfns yet, use this set as a baseline
-    if len(known_lfns) == 0:
-        known_lfns.update(flat_lfns)
-    
-    # check if all lfns are known at this point
-    unknown_lfns = flat_lfns.difference(known_lfns)
-    if len(unknown_lfns) != 0:
-        # if we enter here, lfns appeared that were previously unknown
-        # this shouldn't be possible (unless maybe due to TAPE_RECALLS)
-        # currently being checked
-        msg = ""
-        if verbosity == 0:
-            msg = f"""
-            Encountered {len(unknown_lfns)} while processing dir '{crab_dir}'
-            This is not expected. For more information, use higher level of
-            verbosity.
-            """
-            # raise ValueError(msg)
-            
-        else:
-            unknown_lfns_string = "\n".join(unknown_lfns)
-            from IPython import embed; embed()
-            # raise ValueError(f"""
-            #     Following lfns are not known in '{crab_dir}':
-            #     {unknown_lfns_string}
-
-            #     This should not happen!
-            #     """)
-        known_lfns.update(flat_lfns)
-
     # load the dictionary containing the job stati
     status = get_status(
         sample_dir=sample_dir,
@@ -275,23 +336,89 @@ def check_crab_directory(
     # create complete path on remote WLCG system to output file
     # crab arranges the output files in blocks depending on the job id
     
-    # get maximum ID to identify maximum block number later
-    max_jobid = np.max([int(x) for x in job_details.keys()])
-    # initialize set of outputs
-    job_outputs = set()
-    # get the maximum block number and iterate through the blocks
-    pbar_blocks = tqdm(range(int(max_jobid/1000)+1))
-    for i in pbar_blocks:
-        pbar_blocks.set_description(f"Loading outputs for block {i:04d}")
-        job_outputs.update(
-            interface.load_remote_output(
-                wlcg_path=os.path.join(this_wlcg_template, f"{i:04d}"),
-            )
-        )
+    # get maximum ID to identify maximum block number
+    max_jobid = max(int(x) for x in job_details)
+    blocks = [f"{i:04d}" for i in range(int(max_jobid/1000)+1)]
+    n_blocks = len(blocks)
+    # initialize list of outputs per block
+    block_outputs = list()
+    # list the blocks in parallel, since every listing is a round-trip to
+    # the remote site
+    # the bar is only useful in interactive sessions (and if the bar of the
+    # crab directories is shown), and one description for all blocks avoids
+    # formatting and writing a new one per block
+    pbar_blocks = tqdm(
+        total=n_blocks,
+        desc=f"Loading outputs for {n_blocks} blocks",
+        disable=getattr(pbar, "disable", False) or not sys.stderr.isatty(),
+        mininterval=0.5,
+    )
+    executor = get_listing_executor()
+    futures = {
+        executor.submit(
+            interface.load_remote_output,
+            wlcg_path=os.path.join(this_wlcg_template, block),
+        ): block
+        for block in blocks
+    }
+    for future in as_completed(futures):
+        block = futures[future]
+        # a failing block should not abort the listing of the others
+        try:
+            block_outputs.append(future.result())
+        except Exception as e:
+            print(f"unable to load outputs for block {block}, skipping")
+            print(e)
+        pbar_blocks.update()
+    pbar_blocks.close()
+    # build the set of outputs in one go
+    job_outputs = set(chain.from_iterable(block_outputs))
+
+    # perform sanity checks
+    # if the known lfns are still being loaded in the background, wait for them
+    if known_lfns_future is not None and len(known_lfns) == 0:
+        known_lfns.update(known_lfns_future.result())
+
+    # first load a flat list of lfns
+    flat_lfns = set(chain.from_iterable(input_map.values()))
+
+    # if we don't know any lfns yet, use this set as a baseline
+    if len(known_lfns) == 0:
+        known_lfns.update(flat_lfns)
+    
+    # check if all lfns are known at this point
+    unknown_lfns = flat_lfns.difference(known_lfns)
+    if len(unknown_lfns) != 0:
+        # if we enter here, lfns appeared that were previously unknown
+        # this shouldn't be possible (unless maybe due to TAPE_RECALLS)
+        # currently being checked
+        msg = ""
+        if verbosity == 0:
+            msg = f"""
+            Encountered {len(unknown_lfns)} while processing dir '{crab_dir}'
+            This is not expected. For more information, use higher level of
+            verbosity.
+            """
+            # raise ValueError(msg)
+            
+        else:
+            unknown_lfns_string = "\n".join(unknown_lfns)
+            from IPython import embed; embed()
+            # raise ValueError(f"""
+            #     Following lfns are not known in '{crab_dir}':
+            #     {unknown_lfns_string}
+
+            #     This should not happen!
+            #     """)
+        known_lfns.update(flat_lfns)
+
+    # map the outputs to the job ids once for both of the following checks
+    outputs_by_id = interface.index_job_outputs(job_outputs)
 
     # load information about failed jobs
     interface.check_job_outputs(
         job_outputs=job_outputs,
+        outputs_by_id=outputs_by_id,
         collector_set=failed_job_outputs,
         input_map=input_map,
         job_details=job_details,
@@ -304,6 +431,7 @@ def check_crab_directory(
     ndone = len(done_lfns)
     interface.check_job_outputs(
         job_outputs=job_outputs,
+        outputs_by_id=outputs_by_id,
         collector_set=done_lfns,
         input_map=input_map,
         job_details=job_details,
@@ -325,13 +453,11 @@ def post_processing(
     # so the user can do something
     build_meta_info_table(meta_infos=meta_infos)
 
-    samples_with_missing_lfns = list(filter(
-        lambda x: meta_infos[x]["missing"] != 0 or 
-                   ( meta_infos[x]["das_total"] != meta_infos[x]["total"]
-                        and meta_infos[x]["das_total"] != -1
-                    ), 
-        meta_infos
-    ))
+    samples_with_missing_lfns = [
+        name for name, info in meta_infos.items()
+        if info["missing"] != 0 or
+            (info["das_total"] != info["total"] and info["das_total"] != -1)
+    ]
     if len(samples_with_missing_lfns) != 0:
         print("\n\n")
         print("Samples with missing LFNS:")
@@ -340,13 +466,11 @@ def post_processing(
             outfilename="samples_with_missing_lfns.json"
         )
 
-    samples_wo_missing_lfns = list(filter(
-        lambda x: meta_infos[x]["missing"] == 0 or 
-                   ( meta_infos[x]["das_total"] != meta_infos[x]["total"]
-                        and meta_infos[x]["das_total"] != -1
-                    ), 
-        meta_infos
-    ))
+    samples_wo_missing_lfns = [
+        name for name, info in meta_infos.items()
+        if info["missing"] == 0 or
+            (info["das_total"] != info["total"] and info["das_total"] != -1)
+    ]
     if len(samples_wo_missing_lfns) != 0:
         print("\n\n")
         print("Samples w/o missing LFNS:")
@@ -357,60 +481,100 @@ def post_processing(
     
     if event_comparison and len(event_comparison) > 0:
         # save event comparison
-        with open("event_comparison.json", "w") as f:
-            json.dump(event_comparison, f, indent=4)
+        dump_json(event_comparison, "event_comparison.json")
     
     
 
-def main(*args,
-    sample_dirs=[],
-    # wlcg_dir=None,
-    # wlcg_prefix="",
-    suffices=[],
-    status_files=[],
-    sample_config=None,
-    dump_filelists=False,
-    rm_failed=False,
-    local_job_summary=None,
-    **kwargs
-):
-    """main function. Load information provided by the ArgumentParser. Loops
-    Thorugh the sample directories provided as *sample_dirs* and the *suffices*
-    to check the individual crab base directories.
-    Finally, check if any lfns are unaccounted for in the list of finished jobs.
-    """  
-    # load the information from the argument parser  
-    meta_infos = dict()
-    event_comparison = dict()
+def _init_worker(
+    worker_verbosity: int,
+    use_disk_cache: bool,
+    listing_workers: int,
+) -> None:
+    """Initializer for the worker processes that check the samples.
+    Make sure that the settings from the ArgumentParser are also known
+    to the workers, independent of how the worker processes are started.
 
-    local_job_summary_dict = dict()
-    if local_job_summary:
-        with open(local_job_summary) as f:
-            local_job_summary_dict = json.load(f)
-    # loop through the sample directories containing the crab base directories
-    pbar_sampledirs = tqdm(sample_dirs)
-    for sample_dir in pbar_sampledirs:
-        # if a sample dir does not exist, no need to check it
-        if not os.path.exists(sample_dir):
-            print(f"Directory {sample_dir} does not exist, skipping!")
-            continue
-        sample_dir = sample_dir.strip(os.path.sep)
-
-        # from IPython import embed; embed()
-        # extract the sample name from the sample directory
-        sample_name=os.path.basename(sample_dir)
-        pbar_sampledirs.set_description(f"Checking sample {sample_name}")
-        das_key = interface.load_das_key(
-            sample_name=sample_name, sample_config=sample_config,
-        )
-        # get full set of lfns for this sample
-
-        # if verbosity is >= 2, we perform an event comparison, 
-        # so create lookup map accordingly
-        event_lookup = None
-        # container for event comparisons
-        sample_event_comparison = None
-        sum_events = None
+    Args:
+        worker_verbosity (int): verbosity level to use in the worker
+        use_disk_cache (bool): use the on-disk cache for DBS and DAS queries
+        listing_workers (int):  number of threads used to list the outputs
+                                on the WLCG site in the worker
+    """
+    global max_listing_workers
+    max_listing_workers = listing_workers
+    setup_interface(verbosity=worker_verbosity, use_disk_cache=use_disk_cache)
+
+def process_sample(
+    sample_dir: str,
+    suffices: list[str],
+    status_files: list[str],
+    sample_config: str,
+    dump_filelists: bool=False,
+    rm_failed: bool=False,
+    local_job_infos: dict[str, Any] or None=None,
+    verbosity: int=0,
+    show_progress: bool=True,
+    **kwargs,
+) -> tuple[str, dict[str, Any], list[dict[str, Any]] or None]:
+    """Function to check all crab base directories of a single sample in
+    *sample_dir*. The different samples are independent of each other, so
+    this function can be executed in a separate worker process for each sample
+    (see meth::`main`).
+
+    Args:
+        sample_dir (str): path to the directory containing the crab base directories
+        suffices (list[str]): suffices of the crab base directories to check
+        status_files (list[str]):   names of the status files corresponding
+                                    to the *suffices*
+        sample_config (str):    path to the sample_config.yaml file containing
+                                the DAS keys of the samples
+        dump_filelists (bool, optional):    save the lists of lfns in the
+                                            summary. Defaults to False.
+        rm_failed (bool, optional): remove the outputs of failed jobs at the
+                                    remote site. Defaults to False.
+        local_job_infos (dict, optional):   information about locally run jobs
+                                            for this sample. Defaults to None.
+        verbosity (int, optional):  verbosity level of the output.
+                                    Defaults to 0.
+        show_progress (bool, optional): show progress bars. Disable this if
+                                        several samples are checked at the
+                                        same time. Defaults to True.
+
+    Returns:
+        tuple:  name of the sample, dictionary with the summary for this sample
+                and the list of event comparisons (None if not performed)
+    """
+    # the interface is usually set up by `_init_worker`, but make sure this
+    # function can also be used on its own
+    if interface is None:
+        setup_interface(verbosity=verbosity)
+    sample_dir = sample_dir.rstrip(os.path.sep)
+
+    # extract the sample name from the sample directory
+    sample_name=os.path.basename(sample_dir)
+    das_key = interface.load_das_key(
+        sample_name=sample_name, sample_config=sample_config,
+    )
+    # get full set of lfns for this sample
+
+    # if verbosity is >= 2, we perform an event comparison, 
+    # so create lookup map accordingly
+    event_lookup = None
+    # container for event comparisons
+    sample_event_comparison = None
+    sum_events = None
+
+    # set up the sets to keep track of the lfns
+    done_lfns=set()     # set of lfns processed by successful jobs
+    
+    # set of **outputs** from failed jobs, which shouldn't happen
+    failed_job_outputs=set()    
+
+    # set of relevant time stamps (needed for later merging of files)
+    time_stamps = list()
+
+    with ThreadPoolExecutor(max_workers=1) as dbs_executor:
+        known_lfns_future = None
         if verbosity >= 1:
             event_lookup = interface.create_event_lookup(das_key=das_key)
             # the list of lfns is now the list of keys
@@ -422,32 +586,19 @@ def main(*args,
                 event_lookup = None
         else:
             # otherwise, there is no need to look up the events, so just 
-            # create the set of lfns directly
-            known_lfns=interface.get_dbs_lfns(das_key=das_key)   
-
-        # if the dbs could not be contacted for some reason, use DAS
-        # to load the total number of LFNS
-        if len(known_lfns) > 0:
-            n_total = len(known_lfns)
-        else:
-            # get total number of LFNs from DAS
-            n_total = interface.get_das_information(
-                das_key=das_key
+            # create the set of lfns directly. The lfns are only needed once
+            # the job outputs are listed, so query DBS in the background
+            known_lfns = set()
+            known_lfns_future = dbs_executor.submit(
+                interface.get_dbs_lfns, das_key=das_key,
             )
+        n_dbs_lfns = len(known_lfns)
 
-        # set up the sets to keep track of the lfns
-        done_lfns=set()     # set of lfns processed by successful jobs
-        
-        # set of **outputs** from failed jobs, which shouldn't happen
-        failed_job_outputs=set()    
-
-        # set of relevant time stamps (needed for later merging of files)
-        time_stamps = list()
-
-        
-
+        from tqdm import tqdm
         # loop through suffices to load the respective crab base directories
-        pbar_suffix = tqdm(zip(suffices, status_files))
+        pbar_suffix = tqdm(
+            zip(suffices, status_files), disable=not show_progress
+        )
         for suffix, status_file in pbar_suffix:
             check_crab_directory(
                 sample_dir=sample_dir,
@@ -462,67 +613,209 @@ def main(*args,
                 time_stamps=time_stamps,
                 event_comparison_container=sample_event_comparison,
                 event_lookup=event_lookup,
+                known_lfns_future=known_lfns_future,
+                verbosity=verbosity,
                 **kwargs,
             )
-        
-        local_job_infos = local_job_summary_dict.get(sample_name)
-        if local_job_infos:
-            done_lfns.update(local_job_infos["lfns"])
-            time_stamps.append(local_job_infos["timestamp"])
-
-        # in the end, all LFNs should be accounted for
-        unprocessed_lfns = known_lfns.symmetric_difference(done_lfns)
-
-        sample_dict = dict()
-        sample_dict["das_total"] = n_total
-        sample_dict["total"] = len(known_lfns)
-        if sum_events:
-            sample_dict["sum_events"] = sum_events
-        sample_dict["done"] = len(done_lfns)
-
-        if rm_failed:
-            # rm_bar = tqdm(failed_job_outputs)
-            # for f in rm_bar:
-                # rm_bar.set_description(f"Deleting file {f}")
-            def chunks(lst, n):
-                """Yield successive n-sized chunks from lst."""
-                for i in range(0, len(lst), n):
-                    yield lst[i:i + n]
-            for c in list(chunks(list(failed_job_outputs), 400)):      
-                cmd = f"gfal-rm {' '.join(c)}"
-                call([cmd], shell=True)
-            failed_job_outputs = set()
 
-        if len(failed_job_outputs) > 0:
-            sample_dict["outputs from failed jobs"] = len(failed_job_outputs)
-        sample_dict["missing"] = len(unprocessed_lfns)
-        sample_dict["time_stamps"] = time_stamps.copy()
-        if dump_filelists:
-            sample_dict["total_lfns"] = list(known_lfns.copy())
-            sample_dict["done_lfns"] = list(done_lfns.copy())
-            sample_dict["missing_lfns"] = list(unprocessed_lfns.copy())
-            if len(failed_job_outputs) > 0:
-                sample_dict["failed_outputs"] = list(failed_job_outputs.copy())
-        meta_infos[sample_name] = sample_dict.copy()
-        if sample_event_comparison and len(sample_event_comparison) > 0:
-            event_comparison[sample_name] = sample_event_comparison.copy()
-        elif len(unprocessed_lfns) == 0 and len(failed_job_outputs) > 0:
-            # if the event comparison contains nothing, it might indicate
-            # that we actually processed all events.
-            # We could then consider to delete the job outputs that were 
-            # generated from failed jobs
-            pass
-        
+        if known_lfns_future is not None:
+            dbs_lfns = known_lfns_future.result()
+            n_dbs_lfns = len(dbs_lfns)
+            # in case no crab directory needed the lfns
+            known_lfns.update(dbs_lfns)
+
+    # if the dbs could not be contacted for some reason, use DAS
+    # to load the total number of LFNS
+    if n_dbs_lfns > 0:
+        n_total = n_dbs_lfns
+    else:
+        # get total number of LFNs from DAS
+        n_total = interface.get_das_information(
+            das_key=das_key
+        )
+    
+    if local_job_infos:
+        done_lfns.update(local_job_infos["lfns"])
+        time_stamps.append(local_job_infos["timestamp"])
+
+    # in the end, all LFNs should be accounted for
+    unprocessed_lfns = known_lfns - done_lfns
+    # processed LFNs should always be known. This is the case if and only
+    # if the number of unprocessed LFNs matches, so we only need to look for
+    # unknown processed LFNs if the numbers don't add up
+    if len(unprocessed_lfns) != len(known_lfns) - len(done_lfns):
+        unknown_done_lfns = done_lfns - known_lfns
+        print(" ".join(f"""
+            WARNING: {len(unknown_done_lfns)} processed LFNs for sample
+            {sample_dir} are not in the list of known LFNs
+        """.split()))
         if verbosity >= 3:
-            if len(failed_job_outputs) != 0:
-                print("WARNING: found job outputs that should not be there")
-                print(f"Sample: {sample_dir}")
-                for f in failed_job_outputs:
-                    print(f)
-            if len(unprocessed_lfns) != 0:
-                print(f"WARNING: following LFNs for sample {sample_dir} were not processed!")
-                for f in unprocessed_lfns:
-                    print(f)
+            for f in unknown_done_lfns:
+                print(f)
+
+    sample_dict = dict()
+    sample_dict["das_total"] = n_total
+    sample_dict["total"] = len(known_lfns)
+    if sum_events:
+        sample_dict["sum_events"] = sum_events
+    sample_dict["done"] = len(done_lfns)
+
+    if rm_failed:
+        from subprocess import call
+        # rm_bar = tqdm(failed_job_outputs)
+        # for f in rm_bar:
+            # rm_bar.set_description(f"Deleting file {f}")
+        def chunks(lst, n):
+            """Yield successive n-sized chunks from lst."""
+            for i in range(0, len(lst), n):
+                yield lst[i:i + n]
+        for c in list(chunks(list(failed_job_outputs), 400)):      
+            cmd = f"gfal-rm {' '.join(c)}"
+            call([cmd], shell=True)
+        failed_job_outputs = set()
+
+    if len(failed_job_outputs) > 0:
+        sample_dict["outputs from failed jobs"] = len(failed_job_outputs)
+    sample_dict["missing"] = len(unprocessed_lfns)
+    sample_dict["time_stamps"] = time_stamps
+    if dump_filelists:
+        sample_dict["total_lfns"] = list(known_lfns)
+        sample_dict["done_lfns"] = list(done_lfns)
+        sample_dict["missing_lfns"] = list(unprocessed_lfns)
+        if len(failed_job_outputs) > 0:
+            sample_dict["failed_outputs"] = list(failed_job_outputs)
+    if len(unprocessed_lfns) == 0 and len(failed_job_outputs) > 0 \
+        and not sample_event_comparison:
+        # if the event comparison contains nothing, it might indicate
+        # that we actually processed all events.
+        # We could then consider to delete the job outputs that were
+        # generated from failed jobs
+        pass
+
+    if verbosity >= 3:
+        if len(failed_job_outputs) != 0:
+            print("WARNING: found job outputs that should not be there")
+            print(f"Sample: {sample_dir}")
+            for f in failed_job_outputs:
+                print(f)
+        if len(unprocessed_lfns) != 0:
+            print(f"WARNING: following LFNs for sample {sample_dir} were not processed!")
+            for f in unprocessed_lfns:
+                print(f)
+    return sample_name, sample_dict, sample_event_comparison
+
+def main(*args,
+    sample_dirs=[],
+    # wlcg_dir=None,
+    # wlcg_prefix="",
+    suffices=[],
+    status_files=[],
+    sample_config=None,
+    dump_filelists=False,
+    rm_failed=False,
+    local_job_summary=None,
+    no_dbs_cache=False,
+    verbosity=0,
+    jobs=default_jobs,
+    **kwargs
+):
+    """main function. Load information provided by the ArgumentParser. Loops
+    Thorugh the sample directories provided as *sample_dirs* and the *suffices*
+    to check the individual crab base directories.
+    The samples are independent of each other, so they are checked in
+    parallel worker processes (see meth::`process_sample`), at most *jobs*
+    at the same time. Worker processes cannot open the interactive debug
+    shells, so the samples are checked in this process if *verbosity* is
+    >= 1 or if there is only one sample.
+    Finally, check if any lfns are unaccounted for in the list of finished jobs.
+    """  
+    from concurrent.futures import ProcessPoolExecutor
+    from tqdm import tqdm
+
+    # load the information from the argument parser  
+    meta_infos = dict()
+    event_comparison = dict()
+
+    local_job_summary_dict = dict()
+    if local_job_summary:
+        with open(local_job_summary) as f:
+            local_job_summary_dict = json.load(f)
+
+    # if a sample dir does not exist, no need to check it
+    existing_sample_dirs = list()
+    for sample_dir in sample_dirs:
+        if not os.path.exists(sample_dir):
+            print(f"Directory {sample_dir} does not exist, skipping!")
+            continue
+        existing_sample_dirs.append(sample_dir)
+    if len(existing_sample_dirs) == 0:
+        post_processing(meta_infos=meta_infos, event_comparison=event_comparison)
+        return
+
+    # the interface is only needed where the samples are checked, so it is
+    # set up by `_init_worker`
+    worker_args = (verbosity, not no_dbs_cache, jobs)
+    sample_kwargs = dict(
+        suffices=suffices,
+        status_files=status_files,
+        sample_config=sample_config,
+        dump_filelists=dump_filelists,
+        rm_failed=rm_failed,
+        verbosity=verbosity,
+        **kwargs,
+    )
+    def get_local_job_infos(sample_dir):
+        return local_job_summary_dict.get(
+            os.path.basename(sample_dir.rstrip(os.path.sep))
+        )
+
+    results = dict()
+    # worker processes have no stdin, so the IPython shells that are opened
+    # for debugging with higher verbosity would exit immediately. Also,
+    # parallelizing a single sample has no benefit
+    if verbosity >= 1 or len(existing_sample_dirs) == 1:
+        _init_worker(*worker_args)
+        pbar_sampledirs = tqdm(existing_sample_dirs)
+        for sample_dir in pbar_sampledirs:
+            pbar_sampledirs.set_description(f"Checking sample {sample_dir}")
+            results[sample_dir] = process_sample(
+                sample_dir=sample_dir,
+                local_job_infos=get_local_job_infos(sample_dir),
+                **sample_kwargs,
+            )
+    else:
+        # check the sample directories containing the crab base directories
+        # in parallel. The workers mostly wait for DBS and the remote site,
+        # so the number of CPUs is no useful limit here. The progress bars
+        # of the workers would interfere with each other, so only the bar
+        # for the samples is shown
+        with ProcessPoolExecutor(
+            max_workers=min(len(existing_sample_dirs), jobs),
+            initializer=_init_worker,
+            initargs=worker_args,
+        ) as executor:
+            futures = {
+                executor.submit(
+                    process_sample,
+                    sample_dir=sample_dir,
+                    local_job_infos=get_local_job_infos(sample_dir),
+                    show_progress=False,
+                    **sample_kwargs,
+                ): sample_dir
+                for sample_dir in existing_sample_dirs
+            }
+            pbar_sampledirs = tqdm(as_completed(futures), total=len(futures))
+            for future in pbar_sampledirs:
+                sample_dir = futures[future]
+                pbar_sampledirs.set_description(f"Checked sample {sample_dir}")
+                results[sample_dir] = future.result()
+
+    # keep the order of the samples as given by the user
+    for sample_dir in existing_sample_dirs:
+        sample_name, sample_dict, sample_event_comparison = results[sample_dir]
+        meta_infos[sample_name] = sample_dict
+        if sample_event_comparison:
+            event_comparison[sample_name] = sample_event_comparison
     
     post_processing(meta_infos=meta_infos, event_comparison=event_comparison)
 
@@ -578,11 +871,13 @@ def build_meta_info_table(
     # create final table
     table = "\n".join(lines)
     print(table)
-    with open(outfilename, "w") as f:
-        json.dump(meta_infos, f, indent=4)
+    dump_json(meta_infos, outfilename)
 
 
 def parse_arguments():
+    # only needed when the script is executed, not for the worker processes
+    from argparse import ArgumentParser, RawDescriptionHelpFormatter
+
     description = """
     Small script to cross check crab jobs. This script checks the following:
     - Was every LFN entry in DAS processed?
@@ -622,10 +917,10 @@ def parse_arguments():
 
     parser.add_argument(
         "-w", "--wlcg-dir",
-        help=" ".join("""
-            path to your WLCG directory that is the final destination for your
-            crab jobs. On T2_DESY, this would be your DCACHE (/pnfs) directory
-        """.split()),
+        help=(
+            "path to your WLCG directory that is the final destination for your "
+            "crab jobs. On T2_DESY, this would be your DCACHE (/pnfs) directory"
+        ),
         metavar="PATH/TO/YOUR/WLCG/DIRECTORY",
         type=str,
         default=None,
@@ -634,12 +929,10 @@ def parse_arguments():
     )
     parser.add_argument(
         "--wlcg-prefix",
-        help=" ".join(
-            """
-                Prefix to contact the WLCG directory at the remote site.
-                Defaults to prefix for T2_DESY 
-                (srm://dcache-se-cms.desy.de:8443/srm/managerv2?SFN=)
-            """.split()
+        help=(
+            "Prefix to contact the WLCG directory at the remote site. Defaults to "
+            "prefix for T2_DESY "
+            "(srm://dcache-se-cms.desy.de:8443/srm/managerv2?SFN=)"
         ),
         type=str,
         default="srm://dcache-se-cms.desy.de:8443/srm/managerv2?SFN=",
@@ -647,12 +940,9 @@ def parse_arguments():
     )
     parser.add_argument(
         "--xrd-prefix",
-        help=" ".join(
-            """
-                Prefix to contact the directory at the remote site via XROOTD.
-                Defaults to prefix for T2_DESY 
-                (root://dcache-cms-xrootd.desy.de:1094)
-            """.split()
+        help=(
+            "Prefix to contact the directory at the remote site via XROOTD. "
+            "Defaults to prefix for T2_DESY (root://dcache-cms-xrootd.desy.de:1094)"
         ),
         type=str,
         default="root://dcache-cms-xrootd.desy.de:1094",
@@ -660,25 +950,21 @@ def parse_arguments():
     )
     parser.add_argument(
         "-s", "--suffices",
-        help=" ".join("""
-            specify the suffices you would like for the check of the crab
-            source directory. Can be a list of suffices, e.g. 
-            `-s "" recovery_1 recovery_2`. Defaults to 
-            ["", "recovery_1", "recovery_2`"]
-        """.split()),
+        help=(
+            "specify the suffices you would like for the check of the crab source "
+            'directory. Can be a list of suffices, e.g. `-s "" recovery_1 '
+            'recovery_2`. Defaults to ["", "recovery_1", "recovery_2`"]'
+        ),
         default=None,
         nargs="+",
     )
     parser.add_argument(
         "--status-files",
-        help=" ".join(
-            """
-            List of status files containing job information.
-            Entries in this list are zipped to the list of suffixes (option `-s`)
-            Therefore, the length of this list must be the same as list
-            obtained from option `--suffix`! 
-            Defaults to ["status_0", "status_1", "status"]
-            """.split()
+        help=(
+            "List of status files containing job information. Entries in this list "
+            "are zipped to the list of suffixes (option `-s`) Therefore, the length "
+            "of this list must be the same as list obtained from option `--suffix`! "
+            'Defaults to ["status_0", "status_1", "status"]'
         ),
         default=None,
         nargs="+",
@@ -687,27 +973,24 @@ def parse_arguments():
 
     parser.add_argument(
         "--sample-config", "-c",
-        help=" ".join(
-            """
-            path to sample config that contains the information about the
-            original miniaod files (and thus the original name of the sample).
-            Config must be the in yaml format!
-            """.split()
+        help=(
+            "path to sample config that contains the information about the original "
+            "miniaod files (and thus the original name of the sample). Config must "
+            "be in the yaml format or, for faster loading, converted to the json "
+            "format (file ending '.json')!"
         ),
         default=None,
         required=True,
         dest="sample_config",
-        metavar="path/to/sample_config.yaml"
+        metavar="path/to/sample_config.yaml|json"
     )
 
     parser.add_argument(
         "--dump-filelists",
-        help=" ".join(
-            """
-            save the paths to all lfns, the done lfns, the missing lfns
-            and to outputs on the WLCG remote site from failed jobs
-            in the final summary .json file. Defaults to False
-            """.split()
+        help=(
+            "save the paths to all lfns, the done lfns, the missing lfns and to "
+            "outputs on the WLCG remote site from failed jobs in the final summary "
+            ".json file. Defaults to False"
         ),
         default=False,
         action="store_true",
@@ -716,24 +999,36 @@ def parse_arguments():
 
     parser.add_argument(
         "--rm-failed",
-        help=" ".join(
-            """
-            directly remove job outputs from failed jobs at the remote
-            target location. WARNING: this is not reversible! Please make
-            sure you know what you're doing!
-            """.split()
+        help=(
+            "directly remove job outputs from failed jobs at the remote target "
+            "location. WARNING: this is not reversible! Please make sure you know "
+            "what you're doing!"
         ),
         default=False,
         action="store_true",
         dest="rm_failed",
     )
 
+    parser.add_argument(
+        "--no-dbs-cache",
+        help=(
+            "do not use the cached results of previous DBS and DAS queries (and "
+            "the parsed yaml sample config) and do not update the cache. By "
+            "default, the results of DBS and DAS queries are cached for 24h in "
+            "$XDG_CACHE_HOME/uhh-cms-custom-nanos ($XDG_CACHE_HOME defaults to "
+            "~/.cache)"
+        ),
+        default=False,
+        action="store_true",
+        dest="no_dbs_cache",
+    )
+
     parser.add_argument(
         "sample_dirs",
-        help=" ".join("""
-            Path to sample diectories containing the crab base directories
-            (see description).
-        """.split()),
+        help=(
+            "Path to sample diectories containing the crab base directories (see "
+            "description)."
+        ),
         metavar="PATH/TO/SAMPLE/DIRECTORIES",
         type=str,
         nargs="+",
@@ -743,25 +1038,32 @@ def parse_arguments():
         "-v", "--verbosity",
         type=int,
         default=0,
-        help=" ".join(
-            """
-                control the verbosity of the output. Currently implemented levels
-                0:  just print number of files/outputs for each sample
-                2:  actually check the event contents of the outputs w.r.t. the
-                    corresponding LFN content
-                3:  actually print the paths for the different files
-
-            """.split()
-        )
+        help=(
+            "control the verbosity of the output. Currently implemented levels 0: "
+            "just print number of files/outputs for each sample 2: actually check "
+            "the event contents of the outputs w.r.t. the corresponding LFN content "
+            "3: actually print the paths for the different files"
+        ),
     )
 
 
-    parser.add_argument("-l", "--local-job-summary",
-        help=" ".join(
-            """
-            path to summary files about locally run jobs
-            """.split()
+    parser.add_argument(
+        "-j", "--jobs",
+        help=(
+            "maximum number of samples that are checked in parallel, i.e. of "
+            "concurrent DBS queries and listings on the WLCG site. The same "
+            "limit applies to the threads in each sample worker that list the "
+            "output blocks (one per 1000 jobs) of a crab directory. With "
+            "verbosity >= 1, the samples are checked one after another. "
+            "Defaults to min(32, 4 * number of CPUs)"
         ),
+        type=int,
+        default=default_jobs,
+        dest="jobs",
+    )
+
+    parser.add_argument("-l", "--local-job-summary",
+        help="path to summary files about locally run jobs",
         metavar="path/to/summary_for_local_jobs.json",
         # nargs="+",
         type=str,
@@ -769,18 +1071,41 @@ def parse_arguments():
     )
 
     args = parser.parse_args()
-    if args.suffices == None:
-        args.suffices = ["", "recovery_1", "recovery_2"]
 
-    if args.status_files == None:
-        args.status_files = ["status_0", "status_1", "status"]
+    # the same sample directory can be given several times (e.g. by
+    # overlapping shell globs or symlinks), so only keep the first occurence
+    sample_dirs = dict()
+    for sample_dir in args.sample_dirs:
+        if not os.path.isdir(sample_dir):
+            print(f"Directory {sample_dir} does not exist, skipping!")
+            continue
+        sample_dirs.setdefault(
+            os.path.realpath(sample_dir), os.path.normpath(sample_dir)
+        )
+    if len(sample_dirs) == 0:
+        parser.error("none of the given sample directories exist!")
+    args.sample_dirs = list(sample_dirs.values())
+    if args.suffices is None:
+        args.suffices = list(default_suffices)
+
+    if args.status_files is None:
+        args.status_files = list(default_status_files)
+
+    # the lists are zipped later, so make sure nothing is dropped silently
+    if len(args.suffices) != len(args.status_files):
+        parser.error(
+            f"--suffices ({len(args.suffices)}) and --status-files "
+            f"({len(args.status_files)}) must have equal length"
+        )
     
-    if not os.path.exists(args.sample_config):
+    if args.jobs < 1:
+        parser.error(f"--jobs must be at least 1, got {args.jobs}")
+
+    try:
+        os.stat(args.sample_config)
+    except FileNotFoundError:
         parser.error(f"file {args.sample_config} does not exist!")
     
-    global verbosity
-    verbosity = args.verbosity
-    interface.verbosity = verbosity
     return args
 
 if __name__ == '__main__':
@@ -1,9 +1,20 @@
 import os
+import re
 import sys
+import time
+import pickle
+import hashlib
+import tempfile
+import threading
+import functools
 import yaml
 import json
-import uproot as up
-import numpy as np
+
+# orjson is much faster than json, but it is not available everywhere
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 try:
     import gfal2
@@ -17,29 +28,214 @@ except ImportError as e:
 
 from subprocess import PIPE, Popen
 from itertools import chain
+from collections.abc import Iterable
 from typing import Any
 from tqdm import tqdm
 
+# directory for the persistent cache of DBS and DAS queries
+cache_dir = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")),
+    "uhh-cms-custom-nanos",
+)
+# DAS server endpoint for direct queries, see `WLCGInterface.query_das_server`
+das_url = "https://cmsweb.cern.ch/das/cache"
+# time in seconds after which cached query results are considered outdated
+cache_ttl = 24*60*60
+
+
+def write_cache_file(path: str, content: bytes) -> None:
+    """Function to write *content* to the cache file *path*. The content is
+    written to a temporary file first and moved to the final destination
+    afterwards, so that other processes never see incomplete files.
+    If the file cannot be written, a warning is printed and the temporary
+    file is removed.
+
+    Args:
+        path (str): path to the cache file
+        content (bytes): content of the cache file
+    """
+    tmp_path = None
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"WARNING: unable to cache result in '{path}'")
+        print(e)
+        if tmp_path is not None:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+
+def cache_on_disk(namespace: str, encode=None, decode=None):
+    """Decorator to memoize the result of a query method of WLCGInterface
+    on disk. The result is saved as .json file in the directory
+    *cache_dir*/*namespace*, where the file name is the hash of the DAS key
+    the query was performed for. Results that are older than *cache_ttl*
+    are refreshed. Empty results (e.g. because the service could not be
+    contacted) are not cached. The cache is only used if the attribute
+    'use_disk_cache' of the interface is True and the DAS key is a string
+    (e.g. samples that are not in the sample config have no DAS key).
+
+    Args:
+        namespace (str): name of the subdirectory in *cache_dir*
+        encode (callable, optional):    function to convert the result into
+                                        a json-serializable object.
+                                        Defaults to None.
+        decode (callable, optional):    function to convert the cached object
+                                        back into the result. Defaults to None.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, das_key: str, *args, **kwargs):
+            if not self.use_disk_cache or not isinstance(das_key, str):
+                return func(self, das_key, *args, **kwargs)
+
+            key = hashlib.sha1(das_key.encode()).hexdigest()
+            path = os.path.join(cache_dir, namespace, f"{key}.json")
+
+            # load the cached result if it is still valid
+            try:
+                if time.time() - os.path.getmtime(path) < cache_ttl:
+                    with open(path) as f:
+                        result = json.load(f)
+                    return decode(result) if decode else result
+            except (OSError, ValueError):
+                pass
+
+            result = func(self, das_key, *args, **kwargs)
+            if not result:
+                return result
+
+            write_cache_file(
+                path, json.dumps(encode(result) if encode else result).encode()
+            )
+            return result
+        return wrapper
+    return decorator
+
+
+# crab names the output file of job JOBID 'nano_JOBID.root'
+job_output_regex = re.compile(r"nano_(\d+)\.root$")
+
+# use the libyaml-based loader if available, it's much faster
+yaml_loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+@functools.lru_cache(maxsize=None)
+def _load_sample_config(
+    path: str,
+    mtime_ns: int,
+    size: int,
+    use_disk_cache: bool=True,
+) -> dict:
+    """Load the sample config in *path*. The result is memoized, so that
+    the config is only parsed once for all samples. The modification time
+    *mtime_ns* and the *size* of the file are part of the cache key so that
+    changes to the file are picked up.
+    Configs in json format (file ending '.json') are loaded directly, which
+    is much faster than parsing the yaml format. A yaml config can be
+    converted once with e.g.
+
+    python -c "import yaml,json,sys; json.dump(yaml.safe_load(open(sys.argv[1])), open(sys.argv[2],'w'))" CONFIG.yaml CONFIG.json
+
+    For yaml configs, the parsed config is pickled to *cache_dir*, so that
+    subsequent runs do not need to parse the config again. Only the pickle
+    for the current version of the config is kept.
+
+    Args:
+        path (str): path to the sample_config.yaml file
+        mtime_ns (int): modification time of the file in ns
+        size (int): size of the file in bytes
+        use_disk_cache (bool, optional):    use the pickled config in
+                                            *cache_dir*. Defaults to True.
+
+    Returns:
+        dict: content of the sample config
+    """
+    if path.endswith(".json"):
+        with open(path, "rb") as f:
+            return orjson.loads(f.read()) if orjson else json.load(f)
+
+    if not use_disk_cache:
+        with open(path) as f:
+            return yaml.load(f, yaml_loader)
+
+    key = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()
+    pickle_dir = os.path.join(cache_dir, "sample_configs")
+    pickle_name = f"{key}_{mtime_ns}_{size}.pkl"
+    pickle_path = os.path.join(pickle_dir, pickle_name)
+    try:
+        with open(pickle_path, "rb") as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        pass
+
+    with open(path) as f:
+        sample_dict = yaml.load(f, yaml_loader)
+    write_cache_file(pickle_path, pickle.dumps(sample_dict))
+
+    # remove the pickles of previous versions of this config. Other
+    # processes might do the same at the same time, so ignore failures
+    try:
+        with os.scandir(pickle_dir) as entries:
+            outdated = [
+                x.path for x in entries
+                if x.name.startswith(f"{key}_") and x.name.endswith(".pkl")
+                and x.name != pickle_name
+            ]
+    except OSError:
+        outdated = []
+    for outdated_path in outdated:
+        try:
+            os.remove(outdated_path)
+        except OSError:
+            pass
+    return sample_dict
+
+
+@functools.lru_cache(maxsize=1024)
+def _campaign_name_from_das_key(das_key: str) -> str:
+    """Extract the original campaign name, which is the first part of the
+    DAS key *das_key*. The result is memoized, since it is requested for
+    every crab directory of a sample.
+
+    Args:
+        das_key (str): DAS key of the dataset
+
+    Returns:
+        str: original campaign name
+    """
+    return das_key.split("/")[1]
+
+
 class WLCGInterface(object):
     def __init__(self,
         # wlcg_path: str or None=None,
         # route_url: str or None=None,
         verbosity: int=0,
+        use_disk_cache: bool=True,
     ):
         # self.wlcg_path = wlcg_path
         # self.route_url = route_url
         self.__verbosity = verbosity
-        # setup gfal context
-        try:
-            # create gfal context
-            if not gfal2:
-                raise NotImplementedError("Cannot load remote file without gfal2 module!")
-
-            self.gfal_context = gfal2.creat_context()
-        except NotImplementedError as e:
-            print(e)
-            self.gfal_context = None
+        # cache results of DBS and DAS queries on disk, see `cache_on_disk`
+        self.use_disk_cache = use_disk_cache
+        # gfal contexts must not be shared between threads, so keep one
+        # context per thread. The contexts are created on first use,
+        # see `get_thread_gfal_context`
+        self.__thread_local = threading.local()
+        if not gfal2:
+            print("Cannot load remote file without gfal2 module!")
         self.dbs_api = self.setup_dbs_api()
+        # the session to contact the DAS server is only set up when needed,
+        # see `das_session`
+        self.__das_session = None
+        self.__das_session_initialized = False
         self.xrtd_redirectors = [
             "cms-xrd-global.cern.ch",
             "xrootd-cms.infn.it",
@@ -57,6 +253,10 @@ class WLCGInterface(object):
     def verbosity(self, val: int):
         self.__verbosity = val
 
+    @property
+    def gfal_context(self):
+        return self.get_thread_gfal_context()
+
     
     def setup_dbs_api(
         self,
@@ -74,6 +274,54 @@ class WLCGInterface(object):
             print("Will use dasgoclient as fallback instead")
             return None
 
+    @property
+    def das_session(self):
+        if not self.__das_session_initialized:
+            self.__das_session = self.setup_das_session()
+            self.__das_session_initialized = True
+        return self.__das_session
+
+    def setup_das_session(self):
+        """Function to set up a http session to query the DAS server directly.
+        The session authenticates with the grid proxy in $X509_USER_PROXY
+        (default: /tmp/x509up_uUID) and is kept alive for all queries, so
+        the TLS handshake is only done once.
+
+        Returns:
+            requests.Session or None:   session to contact the DAS server.
+                                        If the requests module or the grid
+                                        proxy is not available, None is returned
+        """
+        try:
+            import requests
+        except ImportError:
+            return None
+        proxy = os.environ.get("X509_USER_PROXY", f"/tmp/x509up_u{os.getuid()}")
+        if not os.path.exists(proxy):
+            return None
+        session = requests.Session()
+        session.cert = (proxy, proxy)
+        ca_dir = os.environ.get("X509_CERT_DIR", "/etc/grid-security/certificates")
+        if os.path.isdir(ca_dir):
+            session.verify = ca_dir
+        return session
+
+    def get_thread_gfal_context(self):
+        """Function to obtain a gfal context for the current thread. gfal
+        contexts are not thread-safe, so each thread creates its own context
+        on first use and reuses it afterwards. Creating a context is expensive
+        (plugins, credentials), so threads should be reused where possible.
+
+        Returns:
+            gfal2.Context or None:  gfal context of the current thread or None
+                                    if gfal2 is not available
+        """
+        context = getattr(self.__thread_local, "gfal_context", None)
+        if context is None and gfal2:
+            context = gfal2.creat_context()
+            self.__thread_local.gfal_context = context
+        return context
+
     def get_remote_file(
         self,
         filepath:str ,
@@ -128,14 +376,36 @@ class WLCGInterface(object):
         if cleanup:
             os.remove(local_file)
 
+    @staticmethod
+    def get_local_path(wlcg_path: str) -> str or None:
+        """Small function to check whether *wlcg_path* points to the local
+        file system, i.e. if it is an absolute path or starts with 'file://'.
+
+        Args:
+            wlcg_path (str): Path to the WLCG target
+
+        Returns:
+            str or None:    path in the local file system if *wlcg_path*
+                            is local, else None
+        """
+        if wlcg_path.startswith("file://"):
+            return wlcg_path[len("file://"):]
+        if wlcg_path.startswith("/"):
+            return wlcg_path
+        return None
+
     def load_remote_output(
         self,
         wlcg_path: str,
     ) -> list[str]:
         """Function to load file paths from a remote WLCG target *wlcg_path*.
-        First, the function checks for the gfal2 module. If gfal is loaded correctly,
-        the list of files from the remote directly *wlcg_path* is loaded.
-        If any of these steps fail, an empty list is returned
+        If *wlcg_path* is in the local file system, the directory is read
+        directly. Otherwise, the function checks for the gfal2 module.
+        If gfal is loaded correctly, the list of files from the remote
+        directly *wlcg_path* is loaded.
+        If any of these steps fail, an empty list is returned.
+        This function can be called from several threads at once, since
+        each thread uses its own gfal context.
 
         Args:
             wlcg_path (str):    Path to the WLCG remote target, which consists of the
@@ -146,20 +416,28 @@ class WLCGInterface(object):
             list[str]:  List of files in remote target *wlcg_path*. Defaults to
                         empty list.
         """
+        local_path = self.get_local_path(wlcg_path)
         try:
+            # no need for the gfal plugins to read a local directory
+            if local_path is not None:
+                with os.scandir(local_path) as entries:
+                    return [os.path.join(wlcg_path, x.name) for x in entries]
             if self.gfal_context:
                 # load list of files
                 filelist = self.gfal_context.listdir(wlcg_path)
                 return [os.path.join(wlcg_path, x) for x in filelist]
             else:
+                # this is called from several threads at once, so there is
+                # no interactive shell for debugging here
                 if self.verbosity >= 1:
-                    print(f"unable to load files from {wlcg_path}, skipping")
-                    from IPython import embed; embed()
+                    print(f"unable to load files from {wlcg_path} without gfal2, skipping")
         except Exception as e:
             print(f"unable to load files from {wlcg_path}, skipping")
         return []
 
     def load_events_from_file(self, remote_file: str, treename: str="Events"):
+        # uproot takes long to import and is only needed for event comparisons
+        import uproot as up
         try:
             from IPython import embed; embed()
             f = up.open({remote_file: treename})
@@ -172,7 +450,7 @@ class WLCGInterface(object):
         return 0
 
     def load_events(self, remote_files: set[str], treename: str="Events"):
-        return np.sum([
+        return sum([
             self.load_events_from_file(remote_file=path, treename=treename) 
             for path in remote_files
         ])
@@ -183,17 +461,16 @@ class WLCGInterface(object):
         job_outputs,
         input_map,
         event_lookup,
+        outputs_by_id=None,
     ):
         event_comparison = list()
+        if outputs_by_id is None:
+            outputs_by_id = self.index_job_outputs(job_outputs)
         pbar_ids = tqdm(relevant_ids)
         
         for id in pbar_ids:
             pbar_ids.set_description(f"Comparing events for job {id}")
-            relevant_job_outputs = set()
-            relevant_job_outputs = set(filter(
-                    lambda x: x.endswith(f"nano_{id}.root"), 
-                    job_outputs
-                ))
+            relevant_job_outputs = set(outputs_by_id.get(id, []))
             all_events = sum([event_lookup.get(x, 0) for x in input_map[id]])
 
             job_events = self.load_events(remote_files=relevant_job_outputs)
@@ -210,6 +487,28 @@ class WLCGInterface(object):
         return event_comparison
 
 
+    def index_job_outputs(
+        self,
+        job_outputs: Iterable[str],
+    ) -> dict[str, list[str]]:
+        """Function to map the output files in *job_outputs* to the ids of
+        the jobs that created them. The output files of crab jobs are named
+        'nano_JOBID.root' (see *job_output_regex*). Files that do not follow
+        this pattern are ignored.
+
+        Args:
+            job_outputs (Iterable[str]): paths to the output files
+
+        Returns:
+            dict[str, list[str]]: Dictionary of format {job_id: list_of_outputs}
+        """
+        outputs_by_id = dict()
+        for path in job_outputs:
+            match = job_output_regex.search(path)
+            if match:
+                outputs_by_id.setdefault(match.group(1), []).append(path)
+        return outputs_by_id
+
     def check_job_outputs(
         self,
         collector_set: set[str],
@@ -222,6 +521,7 @@ class WLCGInterface(object):
         event_lookup: dict or None=None,
         event_comparison_container: list or None=None,
         verbosity: int=0,
+        outputs_by_id: dict[str, list[str]] or None=None,
     ) -> None:
         """Function to collect information about jobs in *job_details*.
         First, all job ids with state *state* are retrieved from *job_details*.
@@ -251,36 +551,41 @@ class WLCGInterface(object):
             job_outputs (set, optional):    if a set of output files is given,
                                             only job ids with output files are
                                             considered as relevant. Defaults to None
+            outputs_by_id (dict, optional): mapping of the *job_outputs* to the
+                                            job ids as created by
+                                            meth::`index_job_outputs`. Pass
+                                            this to reuse the mapping for
+                                            several calls. Defaults to None
 
         Raises:
             ValueError: If a lfn is already marked as done but is associated with
                         a done job again, the ValueError is raised.
         """
 
-        relevant_ids = set(filter(
-            lambda x: job_details[x]["State"] == state,
-            job_details
-        ))
+        relevant_ids = {
+            x for x, details in job_details.items() if details["State"] == state
+        }
 
         # if there are paths to the job outputs available, only select ids that
-        # actually have an output
+        # actually have an output. Map the outputs to the job ids (if not done
+        # already), so that the matching only needs set and dict lookups
         if isinstance(job_outputs, set) and not len(job_outputs) == 0:
-            relevant_ids = set(filter(
-                lambda x: any(path.endswith(f"nano_{x}.root") for path in job_outputs), 
-                relevant_ids
-            ))
+            if outputs_by_id is None:
+                outputs_by_id = self.index_job_outputs(job_outputs)
+            relevant_ids &= outputs_by_id.keys()
+        else:
+            outputs_by_id = dict()
 
         # for state "failed", collect output files that should not be there
         if state == "failed":
-            collector_set.update(filter(
-                lambda x: any(x.endswith(f"nano_{id}.root") for id in relevant_ids), 
-                job_outputs
+            collector_set.update(chain.from_iterable(
+                outputs_by_id.get(x, []) for x in relevant_ids
             ))
         # if state is finished, safe the done lfns (if the output of the job is also 
         # available)
         elif state == "finished":
             
-            lfns = set(chain.from_iterable([input_map[x] for x in relevant_ids]))
+            lfns = set(chain.from_iterable(input_map[x] for x in relevant_ids))
             
             # first check if a lfn is already marked as done - this should not happen
             
@@ -289,7 +594,11 @@ class WLCGInterface(object):
                 # so update prefix accordingly
                 event_comparison_container += self.compare_events(
                     relevant_ids=relevant_ids,
-                    job_outputs=set([x.replace(wlcg_prefix, xrd_prefix) for x in job_outputs]),
+                    job_outputs=job_outputs,
+                    outputs_by_id={
+                        x: [y.replace(wlcg_prefix, xrd_prefix) for y in outputs_by_id.get(x, [])]
+                        for x in relevant_ids
+                    },
                     input_map=input_map,
                     event_lookup=event_lookup
                 )
@@ -322,7 +631,7 @@ class WLCGInterface(object):
     ) -> str or None:
         """Small function to extract the DAS key for sample *sample_name* 
         from the *sample_config*. First, the *sample_config*
-        is opened (has to be in yaml format!). Afterwards, the entry *sample_name*
+        is opened (has to be in yaml or json format!). Afterwards, the entry *sample_name*
         is extracted. This entry should be a dictionary itself, which should contain
         the key 'miniAOD' with the DAS key for this sample.
 
@@ -336,8 +645,11 @@ class WLCGInterface(object):
         """    
         das_key = None
         # open the sample config
-        with open(sample_config) as f:
-            sample_dict = yaml.load(f, yaml.Loader)
+        stat = os.stat(sample_config)
+        sample_dict = _load_sample_config(
+            sample_config, stat.st_mtime_ns, stat.st_size,
+            use_disk_cache=self.use_disk_cache,
+        )
 
         # look up information for sample_name
         sample_info = sample_dict.get(sample_name, dict())
@@ -352,7 +664,9 @@ class WLCGInterface(object):
         """small function to translate the sample name attributed by the 
         crabOverseer to the original MC campaign name. The original 
         campaign name is then extracted from the DAS key. If any of these steps
-        fails, the fucntion returns an empty string
+        fails, the fucntion returns an empty string.
+        The result only depends on the DAS key, so it is memoized
+        (see `_campaign_name_from_das_key`).
 
         Args:
             das_key (str):  DAS key in str format. Any other format will return
@@ -373,7 +687,7 @@ class WLCGInterface(object):
             return sample_campaign
 
         # original campaign name is the first part of the DAS key
-        sample_campaign = das_key.split("/")[1]
+        sample_campaign = _campaign_name_from_das_key(das_key)
         
         return sample_campaign
 
@@ -382,10 +696,7 @@ class WLCGInterface(object):
         file_list = self.dbs_api.listFiles(dataset=das_key, detail=1)
         # by default, this list contains _all_ files (also LFNs that are not
         # reachable) so filter out broken files
-        file_list = list(filter(
-            lambda x: x["is_file_valid"] == True,
-            file_list
-        ))
+        file_list = [x for x in file_list if x["is_file_valid"] == True]
         return file_list
     
     def create_event_lookup(
@@ -399,10 +710,12 @@ class WLCGInterface(object):
             }
         return dict()
 
+    @cache_on_disk("dbs", encode=sorted, decode=set)
     def get_dbs_lfns(self, das_key: str) -> set[str]:
         """Small function to load complete list of valid LFNs for dataset with
         DAS key *das_key*. Only files where the flag 'is_file_valid' is True
-        are considered. Returns set of lfn paths if successful, else an empty set
+        are considered. Returns set of lfn paths if successful, else an empty set.
+        The result is cached on disk, see `cache_on_disk`.
 
         Args:
             das_key (str): key in CMS DBS service for the dataset of interest
@@ -417,9 +730,86 @@ class WLCGInterface(object):
         # load the files
         if self.dbs_api:
             file_list = self.load_valid_file_list(das_key=das_key)
-            output_set = set([x["logical_file_name"] for x in file_list])
+            output_set = {x["logical_file_name"] for x in file_list}
         return output_set 
 
+    def query_das_server(self, das_key: str) -> list[dict[str, Any]] or None:
+        """Small function to query the DAS server for the dataset with DAS key
+        *das_key* via https, using the session from `das_session`.
+
+        Args:
+            das_key (str): key in CMS DAS service for the dataset of interest
+
+        Returns:
+            list[dict[str, Any]] or None:   records for the dataset in the same
+                                            format as the output of
+                                            `dasgoclient -json`. If the server
+                                            cannot be queried or has no
+                                            result (yet), None is returned
+        """
+        if not isinstance(das_key, str) or not self.das_session:
+            return None
+        query = das_key if "=" in das_key else f"dataset={das_key}"
+        try:
+            response = self.das_session.get(
+                das_url,
+                params={"input": query, "idx": 0, "limit": 0},
+                timeout=60,
+            )
+            response.raise_for_status()
+            result = response.json()
+        except Exception as e:
+            if self.verbosity >= 1:
+                print(f"unable to query DAS server for '{das_key}'")
+                print(e)
+            return None
+        # while the server is still processing the query, it only reports
+        # the status of the request
+        if not isinstance(result, dict) or result.get("status") != "ok":
+            return None
+        return result.get("data") or None
+
+    @cache_on_disk("das")
+    def query_das(self, das_key: str) -> list[dict[str, Any]]:
+        """Small function to query DAS for the dataset with DAS key *das_key*.
+        If possible, the DAS server is contacted directly (see
+        `query_das_server`), else dasgoclient is used.
+        The result is cached on disk, see `cache_on_disk`.
+
+        Args:
+            das_key (str): key in CMS DAS service for the dataset of interest
+
+        Returns:
+            list[dict[str, Any]]:   output of dasgoclient. If the query fails
+                                    or *das_key* is not a string, an empty
+                                    list is returned
+        """
+        if not isinstance(das_key, str):
+            return []
+        das_infos = self.query_das_server(das_key=das_key)
+        if das_infos is not None:
+            return das_infos
+
+        # execute DAS query for sample with *das_key*. dasgoclient is executed
+        # directly, so there is no need for an additional shell
+        try:
+            process = Popen(
+                ["dasgoclient", "--query", das_key, "-json"],
+                stdout=PIPE, stderr=PIPE,
+            )
+        except OSError as e:
+            print("unable to execute dasgoclient")
+            print(e)
+            return []
+        # load output of query
+        output, stderr = process.communicate()
+        # output is a string of form list(dict()) and can be parsed with
+        # the json module
+        try:
+            return json.loads(output)
+        except Exception as e:
+            return []
+
     def get_das_information(
         self,
         das_key: str,
@@ -433,20 +823,9 @@ class WLCGInterface(object):
             """)
         output_value = default
 
-        # execute DAS query for sample with *das_key*
-        process = Popen(
-            [f"dasgoclient --query '{das_key}' -json"], 
-            shell=True, stdin=PIPE, stdout=PIPE
-        )
-        # load output of query
-        output, stderr = process.communicate()
-        # from IPython import embed; embed()
-        # output is a string of form list(dict()) and can be parsed with
-        # the json module
-        try:
-            das_infos = json.loads(output)
-        except Exception as e:
-            # something went wrong in the parsing, so just return the default
+        das_infos = self.query_das(das_key=das_key)
+        if not das_infos:
+            # something went wrong in the query, so just return the default
             return output_value
         # not all dicts have the same (relevant) information, so go look for the
         # correct entry in list. Relevant information for us is the total